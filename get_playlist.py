@@ -1,7 +1,56 @@
 # YouTube Playlist URL Extractor with External Configuration
 import requests
+import gzip
 import json
 import os
+import re
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Optional: yt-dlp extraction method
+try:
+    import yt_dlp
+    _HAS_YTDLP = True
+except ImportError:
+    yt_dlp = None
+    _HAS_YTDLP = False
+
+# Prefer orjson for parsing API responses when it is installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Shared HTTP session so paginated API calls reuse one keep-alive connection.
+# Rate limits (429) and transient server errors are retried with exponential
+# backoff, honouring Retry-After; the last response is returned, not raised.
+_RETRY = Retry(
+    total=5,
+    backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    respect_retry_after_header=True,
+    allowed_methods=('GET',),
+    raise_on_status=False
+)
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=_RETRY)
+_SESSION.mount('https://', _ADAPTER)
+_SESSION.mount('http://', _ADAPTER)
+_SESSION.headers.update({
+    'Accept-Encoding': 'gzip',
+    'User-Agent': 'transcript_downloader/1.0'
+})
+
+# Prefix of a video watch URL; the video ID is appended
+WATCH_URL = 'https://www.youtube.com/watch?v='
+
+# Playlist ID in the query string of a playlist URL
+_LIST_RE = re.compile(r'[?&]list=([^&#]+)')
+
+# Local cache of extracted playlists, keyed by playlist ID
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'transcript_downloader')
 
 # Configuration management functions
 def load_config_from_file(config_file='config.txt'):
@@ -17,8 +66,10 @@ def load_config_from_file(config_file='config.txt'):
         with open(config_file, 'r', encoding='utf-8') as f:
             for line in f:
                 line = line.strip()
-                if line and '=' in line and not line.startswith('#'):
-                    key, value = line.split('=', 1)
+                if not line or line.startswith('#'):
+                    continue
+                key, sep, value = line.partition('=')
+                if sep:
                     config[key.strip()] = value.strip()
         return config
     except FileNotFoundError:
@@ -50,48 +101,118 @@ OUTPUT_FILE=urls.txt
 def load_config_from_env():
     """Load configuration from environment variables"""
     return {
-        'PLAYLIST_URL': os.getenv('YOUTUBE_PLAYLIST_URL', ''),
-        'API_KEY': os.getenv('YOUTUBE_API_KEY', ''),
-        'OUTPUT_FILE': os.getenv('OUTPUT_FILE', 'urls.txt')
+        'PLAYLIST_URL': os.environ.get('YOUTUBE_PLAYLIST_URL', ''),
+        'API_KEY': os.environ.get('YOUTUBE_API_KEY', ''),
+        'OUTPUT_FILE': os.environ.get('OUTPUT_FILE', 'urls.txt')
     }
 
+# Playlist cache functions
+def _cache_path(playlist_id):
+    """Path of the cache file for a playlist"""
+    return os.path.join(CACHE_DIR, f"{playlist_id}.json")
+
+def _cache_get(playlist_id, ttl=600):
+    """
+    Load a cached playlist entry
+    
+    Args:
+        playlist_id (str): YouTube playlist ID
+        ttl (int): Seconds for which a cached entry counts as fresh
+    
+    Returns:
+        tuple: (entry dict or None, True if the entry is still fresh)
+    """
+    try:
+        with open(_cache_path(playlist_id), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None, False
+    return entry, time.time() - entry.get('fetched_at', 0) < ttl
+
+def _cache_put(playlist_id, urls, etag):
+    """Store extracted URLs and, for single-page playlists, the page's ETag"""
+    entry = {'fetched_at': time.time(), 'etag': etag, 'urls': urls}
+    path = _cache_path(playlist_id)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error writing playlist cache: {e}")
+
 # Core extraction functions
-def extract_urls_with_api(playlist_id, api_key):
+def _api_error_message(response, default):
+    """
+    Get the message from a YouTube API error response
+    
+    Only JSON bodies are decoded; anything else (e.g. an HTML page from a
+    proxy) falls back to the HTTP reason phrase.
+    """
+    if 'json' not in response.headers.get('Content-Type', ''):
+        return response.reason or default
+    try:
+        return _json_loads(response.content)['error']['message']
+    except (ValueError, KeyError, TypeError):
+        return response.reason or default
+
+def extract_urls_with_api(playlist_id, api_key, use_cache=True, ttl=600):
     """
     Extract YouTube URLs from playlist using YouTube Data API v3
     
     Args:
         playlist_id (str): YouTube playlist ID
         api_key (str): YouTube Data API key
+        use_cache (bool): Reuse a previous extraction of the same playlist
+        ttl (int): Seconds a cached extraction is returned without revalidation
     
     Returns:
         list: List of video URLs
     """
     base_url = "https://www.googleapis.com/youtube/v3/playlistItems"
-    video_urls = []
+    video_ids = {}  # Insertion-ordered set; playlists can repeat a video
     next_page_token = None
+    etag = None
+    pages = 0
+    complete = False
+    
+    cached, fresh = _cache_get(playlist_id, ttl) if use_cache else (None, False)
+    if fresh:
+        print(f"Using cached playlist ({len(cached['urls'])} videos)")
+        return cached['urls']
     
     while True:
         # API parameters
         params = {
-            'part': 'snippet',
+            'part': 'contentDetails',
             'playlistId': playlist_id,
             'key': api_key,
-            'maxResults': 50  # Maximum allowed per request
+            'maxResults': 50,  # Maximum allowed per request
+            'fields': 'nextPageToken,items(contentDetails/videoId)'  # Only what we read
         }
         
+        headers = {}
         if next_page_token:
             params['pageToken'] = next_page_token
+        elif cached and cached.get('etag'):
+            # Revalidate the stale cache entry; only single-page playlists
+            # store an ETag, since it covers every item they contain
+            headers['If-None-Match'] = cached['etag']
         
         try:
             # Make API request
-            response = requests.get(base_url, params=params)
+            response = _SESSION.get(base_url, params=params, headers=headers, timeout=(5, 30))
+            
+            # Playlist unchanged since it was cached
+            if response.status_code == 304:
+                _cache_put(playlist_id, cached['urls'], cached['etag'])
+                return cached['urls']
             
             # Better error handling with detailed response
             if response.status_code != 200:
-                error_data = response.json() if response.content else {}
-                error_message = error_data.get('error', {}).get('message', 'Unknown error')
-                error_code = error_data.get('error', {}).get('code', response.status_code)
+                error_code = response.status_code
+                error_message = _api_error_message(response, 'Unknown error')
                 
                 print(f"API Error {error_code}: {error_message}")
                 
@@ -111,23 +232,23 @@ def extract_urls_with_api(playlist_id, api_key):
                     print("1. The playlist ID is correct")
                     print("2. The playlist is public or you have access")
                 
+                if video_ids:
+                    print(f"Keeping {len(video_ids)} URLs extracted before the error")
                 break
             
-            data = response.json()
+            data = _json_loads(response.content)
+            pages += 1
+            if pages == 1:
+                etag = response.headers.get('ETag')
             
-            # Extract video IDs and create URLs
+            # Collect video IDs (duplicates collapse into one entry)
             for item in data.get('items', []):
-                try:
-                    video_id = item['snippet']['resourceId']['videoId']
-                    video_url = f"https://www.youtube.com/watch?v={video_id}"
-                    video_urls.append(video_url)
-                except KeyError:
-                    # Skip items that don't have video IDs (e.g., private videos)
-                    continue
+                video_ids[item['contentDetails']['videoId']] = None
             
             # Check if there are more pages
             next_page_token = data.get('nextPageToken')
             if not next_page_token:
+                complete = True
                 break
                 
         except requests.exceptions.RequestException as e:
@@ -140,35 +261,64 @@ def extract_urls_with_api(playlist_id, api_key):
             print(f"Unexpected error: {e}")
             break
     
+    video_urls = [WATCH_URL + video_id for video_id in video_ids]
+    
+    # Only complete extractions are cached. A later page can change while the
+    # first page's ETag stays the same, so multi-page playlists are always
+    # refetched in full once the TTL expires.
+    if complete and use_cache:
+        _cache_put(playlist_id, video_urls, etag if pages == 1 else None)
+    
     return video_urls
 
+def extract_urls_validated(playlist_url, api_key):
+    """
+    Extract YouTube URLs from a playlist URL using YouTube Data API v3
+    
+    The URL is parsed once and the first API response doubles as validation
+    of both the playlist and the API key, so no separate checks are made.
+    
+    Args:
+        playlist_url (str): Full YouTube playlist URL, or a bare playlist ID
+        api_key (str): YouTube Data API key
+    
+    Returns:
+        list: List of video URLs (empty if the URL or API key is invalid)
+    """
+    if not playlist_url:
+        print("No playlist ID found in URL")
+        return []
+    
+    return extract_urls_with_api(get_playlist_id_from_url(playlist_url), api_key)
+
+_YDL = None
+
+def _get_ydl():
+    """Shared YoutubeDL instance, created on first use"""
+    global _YDL
+    if _YDL is None:
+        _YDL = yt_dlp.YoutubeDL({
+            'quiet': True,
+            'extract_flat': True,  # Don't download, just extract info
+        })
+    return _YDL
+
 def extract_urls_with_ytdlp(playlist_url):
     """
     Extract URLs using yt-dlp library
     Note: Requires 'pip install yt-dlp'
     """
-    try:
-        import yt_dlp
-        
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': True,  # Don't download, just extract info
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            playlist_info = ydl.extract_info(playlist_url, download=False)
-            
-            urls = []
-            for entry in playlist_info.get('entries', []):
-                if entry:
-                    video_url = f"https://www.youtube.com/watch?v={entry['id']}"
-                    urls.append(video_url)
-            
-            return urls
-            
-    except ImportError:
+    if not _HAS_YTDLP:
         print("yt-dlp not installed. Install with: pip install yt-dlp")
         return []
+    
+    try:
+        playlist_info = _get_ydl().extract_info(playlist_url, download=False)
+        
+        video_ids = dict.fromkeys(
+            entry['id'] for entry in playlist_info.get('entries', []) if entry
+        )
+        return [WATCH_URL + video_id for video_id in video_ids]
     except Exception as e:
         print(f"Error with yt-dlp: {e}")
         return []
@@ -183,29 +333,27 @@ def get_playlist_id_from_url(playlist_url):
     Returns:
         str: Playlist ID
     """
-    if 'list=' in playlist_url:
-        return playlist_url.split('list=')[1].split('&')[0]
-    return playlist_url
+    m = _LIST_RE.search(playlist_url)
+    return m.group(1) if m else playlist_url
 
 def validate_api_key(api_key):
     """
     Validate the YouTube Data API key by making a simple test request
+    (i18nLanguages.list costs 1 quota unit, search.list would cost 100)
     """
-    test_url = "https://www.googleapis.com/youtube/v3/search"
+    test_url = "https://www.googleapis.com/youtube/v3/i18nLanguages"
     params = {
         'part': 'snippet',
-        'q': 'test',
         'key': api_key,
-        'maxResults': 1
+        'fields': 'kind'
     }
     
     try:
-        response = requests.get(test_url, params=params)
+        response = _SESSION.get(test_url, params=params, timeout=(5, 30))
         if response.status_code == 200:
             return True, "API key is valid"
         else:
-            error_data = response.json() if response.content else {}
-            error_message = error_data.get('error', {}).get('message', 'Invalid API key')
+            error_message = _api_error_message(response, 'Invalid API key')
             return False, f"API key validation failed: {error_message}"
     except Exception as e:
         return False, f"Error validating API key: {e}"
@@ -228,31 +376,22 @@ def validate_playlist_url(playlist_url):
         return False, "Playlist ID seems too short"
     
     return True, f"Valid playlist ID: {playlist_id}"
-    """
-    Extract playlist ID from YouTube playlist URL
-    
-    Args:
-        playlist_url (str): Full YouTube playlist URL
-        
-    Returns:
-        str: Playlist ID
-    """
-    if 'list=' in playlist_url:
-        return playlist_url.split('list=')[1].split('&')[0]
-    return playlist_url
 
 def save_urls_to_file(urls, filename='urls.txt'):
     """
-    Save URLs to a text file
+    Save URLs to a text file (gzip-compressed if filename ends with .gz)
     
     Args:
         urls (list): List of URLs
         filename (str): Output filename
     """
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            for url in urls:
-                f.write(url + '\n')
+        if filename.endswith('.gz'):
+            f = gzip.open(filename, 'wt', encoding='utf-8', compresslevel=1)
+        else:
+            f = open(filename, 'w', encoding='utf-8', buffering=1 << 16)
+        with f:
+            f.writelines(f'{url}\n' for url in urls)
         print(f"Successfully saved {len(urls)} URLs to {filename}")
     except IOError as e:
         print(f"Error saving to file: {e}")
@@ -296,27 +435,19 @@ def main_with_config():
     print(f"Using playlist: {playlist_url}")
     print(f"Output file: {output_file}")
     
-    # Validate inputs
-    print("\nValidating configuration...")
-    
-    # Validate playlist URL
-    url_valid, url_message = validate_playlist_url(playlist_url)
-    print(f"Playlist URL: {url_message}")
-    if not url_valid:
-        return
-    
-    # Validate API key
-    print("Validating API key...")
-    key_valid, key_message = validate_api_key(api_key)
-    print(f"API Key: {key_message}")
-    if not key_valid:
-        return
+    # Validate API key only on request; a bad key is reported by the first
+    # playlistItems call anyway, so this round-trip is usually redundant
+    if os.environ.get('VALIDATE_KEY'):
+        print("Validating API key...")
+        key_valid, key_message = validate_api_key(api_key)
+        print(f"API Key: {key_message}")
+        if not key_valid:
+            return
     
-    # Extract playlist ID and get URLs
-    playlist_id = get_playlist_id_from_url(playlist_url)
-    print(f"\nExtracting URLs from playlist ID: {playlist_id}")
+    # Extract URLs; the first API response reports a bad playlist or API key
+    print("\nExtracting URLs from playlist...")
     
-    urls = extract_urls_with_api(playlist_id, api_key)
+    urls = extract_urls_validated(playlist_url, api_key)
     
     if urls:
         print(f"\nFound {len(urls)} videos in the playlist")
@@ -400,8 +531,7 @@ def run_with_config_file():
     """Run extraction using config.txt file"""
     config = load_config_from_file('config.txt')
     if config.get('PLAYLIST_URL') and config.get('API_KEY'):
-        playlist_id = get_playlist_id_from_url(config['PLAYLIST_URL'])
-        urls = extract_urls_with_api(playlist_id, config['API_KEY'])
+        urls = extract_urls_validated(config['PLAYLIST_URL'], config['API_KEY'])
         output_file = config.get('OUTPUT_FILE', 'urls.txt')
         save_urls_to_file(urls, output_file)
         return urls
@@ -413,8 +543,7 @@ def run_with_env_vars():
     """Run extraction using environment variables"""
     config = load_config_from_env()
     if config.get('PLAYLIST_URL') and config.get('API_KEY'):
-        playlist_id = get_playlist_id_from_url(config['PLAYLIST_URL'])
-        urls = extract_urls_with_api(playlist_id, config['API_KEY'])
+        urls = extract_urls_validated(config['PLAYLIST_URL'], config['API_KEY'])
         output_file = config.get('OUTPUT_FILE', 'urls.txt')
         save_urls_to_file(urls, output_file)
         return urls
@@ -4,15 +4,23 @@ YouTube Transcript Extractor - No Proxy Version
 Removes Tor dependency and focuses on robust retry mechanisms
 """
 
+import argparse
+import atexit
+import json
 import logging
 import os
+import queue
 import random
 import re
 import sys
+import threading
 import time
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener
+from typing import Any, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 from youtube_transcript_api import (
     YouTubeTranscriptApi,
     IpBlocked,
@@ -21,6 +29,12 @@ from youtube_transcript_api import (
     TranscriptsDisabled,
 )
 
+# Precompiled patterns for URL parsing, filename cleanup and title scraping
+_RE_VID = re.compile(r"(?:youtu\.be/|/shorts/|[?&]v=)([a-zA-Z0-9_-]{11})")
+_RE_BAD_FN = re.compile(r'[<>:"/\\|?*\n\r]+')
+_RE_WS = re.compile(r"\s+")
+_RE_TITLE = re.compile(r"<title>(.+?)</title>", re.DOTALL)
+
 # Setup logging
 def setup_logging():
     os.makedirs("logs", exist_ok=True)
@@ -28,70 +42,211 @@ def setup_logging():
     logger.setLevel(logging.DEBUG)
     
     # File and console handlers
-    fh = logging.FileHandler("logs/transcript_extractor.log", encoding="utf-8")
+    fh = logging.FileHandler("logs/transcript_extractor.log", encoding="utf-8", delay=True)
     ch = logging.StreamHandler()
     
     formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
     fh.setFormatter(formatter)
     ch.setFormatter(formatter)
     
-    logger.addHandler(fh)
-    logger.addHandler(ch)
+    # Workers only enqueue records; a background listener does the formatting
+    # and file/console I/O, so logging never blocks on the handler locks
+    # File writes are batched: flushed every 256 records or on any error
+    mh = MemoryHandler(capacity=256, flushLevel=logging.ERROR, target=fh)
+    log_queue = queue.Queue(-1)
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, mh, ch, respect_handler_level=True)
+    listener.start()
+    # Exit handlers run in reverse: drain the queue, then flush the batch
+    atexit.register(mh.flush)
+    atexit.register(listener.stop)
+    
+    # Record attributes the format string never uses
+    logging.logProcesses = False
+    logging.logThreads = False
+    logging.logMultiprocessing = False
     return logger
 
 logger = setup_logging()
 
-class TranscriptExtractor:
+# Returns a small JSON document with the video title
+OEMBED_URL = "https://www.youtube.com/oembed"
+
+# On-disk cache of titles and transcripts, keyed by video ID
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "transcript_downloader")
+TITLE_TTL = 24 * 3600
+TRANSCRIPT_TTL = 7 * 24 * 3600
+
+class _Congestion:
+    """
+    Backoff factor shared by all workers, adapted to how often YouTube blocks us
+    
+    Each block doubles the factor (up to max_factor); each success decays it
+    by alpha back towards 1.0, so retry waits grow under sustained blocking
+    and shrink again once requests get through.
+    """
+    alpha = 0.1
+    max_factor = 32.0
+    
     def __init__(self):
-        self.api = YouTubeTranscriptApi()
-        self.min_delay = 5  # Increased delay to avoid blocks
-        self.max_delay = 15
+        self.factor = 1.0
+        self._lock = threading.Lock()
+    
+    def observe(self, blocked: bool) -> None:
+        with self._lock:
+            if blocked:
+                self.factor = min(self.factor * 2, self.max_factor)
+            else:
+                self.factor = max(1.0, self.factor * (1 - self.alpha))
+
+class TranscriptExtractor:
+    _congestion = _Congestion()
+    
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR):
+        self._local = threading.local()
+        self.cache_dir = cache_dir  # None disables caching
+        self._claims_by_dir = {}  # output_dir -> {file name: video ID}
+        self._claims_lock = threading.Lock()
+        # Short spacing between requests; workers run in parallel, and IP
+        # blocks are handled by the congestion backoff from block_delay
+        self.min_delay = 0.5
+        self.max_delay = 1.5
+        self.block_delay = 5
         self.max_retries = 3
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
 
+    @property
+    def _session(self) -> requests.Session:
+        """Pooled HTTP session of the calling thread (sessions are not thread-safe)"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._local.session = session
+        return session
+    
+    @property
+    def api(self) -> YouTubeTranscriptApi:
+        """Transcript API of the calling thread, sharing its pooled session"""
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = YouTubeTranscriptApi(http_client=self._session)
+            self._local.api = api
+        return api
+    
+    def _cache_get(self, kind: str, video_id: str, ttl: int) -> Optional[Any]:
+        """Return a cached value younger than ttl seconds, or None"""
+        if not self.cache_dir:
+            return None
+        path = os.path.join(self.cache_dir, kind, f"{video_id}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("fetched_at", 0) >= ttl:
+            return None
+        return entry.get("value")
+    
+    def _cache_put(self, kind: str, video_id: str, value: Any) -> None:
+        """Store a value in the cache, ignoring write failures"""
+        if not self.cache_dir:
+            return
+        cache_dir = os.path.join(self.cache_dir, kind)
+        path = os.path.join(cache_dir, f"{video_id}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"fetched_at": time.time(), "value": value}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write {kind} cache for {video_id}: {e}")
+    
     def _rand_delay(self):
         return random.uniform(self.min_delay, self.max_delay)
     
+    def _wait(self, scale: float = 1.0) -> None:
+        """Sleep for a random delay between requests, optionally scaled"""
+        time.sleep(self._rand_delay() * scale)
+    
     def _extract_video_id(self, url: str) -> str:
-        if "youtu.be/" in url:
-            return url.split("youtu.be/")[1].split("?")[0]
-        match = re.search(r"[?&]v=([a-zA-Z0-9_-]{11})", url)
+        match = _RE_VID.search(url)
         if not match:
             raise ValueError(f"Cannot parse video ID from URL: {url}")
         return match.group(1)
     
     def _sanitize_filename(self, name: str) -> str:
-        name = re.sub(r'[<>:"/\\|?*\n\r]+', "", name).strip()
-        return re.sub(r"\s+", " ", name)[:250]
+        name = _RE_BAD_FN.sub("", name).strip()
+        return _RE_WS.sub(" ", name)[:250]
+    
+    def _fetch_title_oembed(self, url: str) -> Optional[str]:
+        """Title from the oEmbed endpoint, or None if it has none for this video"""
+        response = self._session.get(
+            OEMBED_URL, params={"url": url, "format": "json"}, timeout=10
+        )
+        if response.status_code != 200:
+            return None
+        try:
+            return response.json()["title"]
+        except (ValueError, KeyError):
+            return None
+    
+    def _fetch_title_html(self, url: str) -> Optional[str]:
+        """Title scraped from the watch page, reading only up to </title>"""
+        head = bytearray()
+        with self._session.get(url, stream=True, timeout=15) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=4096):
+                head += chunk
+                if b"</title>" in head:
+                    break
+        
+        match = _RE_TITLE.search(head.decode("utf-8", "ignore"))
+        if match:
+            return match.group(1).replace("- YouTube", "").strip()
+        return None
     
     def _fetch_title(self, url: str) -> str:
         """Fetch title with extended retry logic"""
+        video_id = self._extract_video_id(url)
+        cached = self._cache_get("titles", video_id, TITLE_TTL)
+        if cached is not None:
+            return cached
+        
         for attempt in range(self.max_retries):
             try:
-                time.sleep(self._rand_delay())
-                response = requests.get(url, headers=self.headers, timeout=30)
-                response.raise_for_status()
-                
-                match = re.search(r"<title>(.+?)</title>", response.text)
-                if match:
-                    title = match.group(1).replace("- YouTube", "").strip()
-                    return self._sanitize_filename(title)
+                self._wait()
+                # oEmbed is a few hundred bytes; the watch page is the fallback
+                title = self._fetch_title_oembed(url) or self._fetch_title_html(url)
+                if title:
+                    title = self._sanitize_filename(title)
+                    self._cache_put("titles", video_id, title)
+                    return title
             except Exception as e:
                 logger.warning(f"Title fetch attempt {attempt + 1} failed: {e}")
                 if attempt < self.max_retries - 1:
-                    time.sleep(self._rand_delay() * (attempt + 1))
+                    self._wait(attempt + 1)
         
         # Fallback to video ID
-        return self._extract_video_id(url)
+        return video_id
     
     def _fetch_transcript_direct(self, video_id: str) -> List[dict]:
         """Direct transcript fetch without proxy"""
+        cached = self._cache_get("transcripts", video_id, TRANSCRIPT_TTL)
+        if cached is not None:
+            logger.info(f"Using cached transcript for video ID: {video_id}")
+            return cached
+        
         for attempt in range(self.max_retries):
             try:
                 # Extended delay to avoid rate limiting
-                time.sleep(self._rand_delay())
+                self._wait()
                 
                 transcript_list = self.api.list(video_id)
                 
@@ -104,14 +259,17 @@ class TranscriptExtractor:
                     logger.info("Manual English not found, trying auto-generated")
                     transcript = transcript_list.find_generated_transcript(language)
                 
-                return transcript.fetch().to_raw_data()
-                time.sleep(5)  # Additional delay after successful fetch
+                transcript_data = transcript.fetch().to_raw_data()
+                self._congestion.observe(False)
+                self._cache_put("transcripts", video_id, transcript_data)
+                return transcript_data
                 
             except (IpBlocked, RequestBlocked) as e:
                 logger.error(f"IP blocked on attempt {attempt + 1}: {e}")
+                self._congestion.observe(True)
                 if attempt < self.max_retries - 1:
-                    # Exponential backoff for IP blocks
-                    wait_time = self._rand_delay() * (2 ** attempt)
+                    # Back off by how congested all workers have found YouTube
+                    wait_time = self.block_delay * self._congestion.factor
                     logger.info(f"Waiting {wait_time:.1f}s before retry...")
                     time.sleep(wait_time)
                 else:
@@ -123,10 +281,80 @@ class TranscriptExtractor:
             except Exception as e:
                 logger.warning(f"Attempt {attempt + 1} failed: {e}")
                 if attempt < self.max_retries - 1:
-                    time.sleep(self._rand_delay())
+                    self._wait()
         
         raise RuntimeError(f"Failed after {self.max_retries} attempts")
     
+    def _done_marker(self, video_id: str, output_dir: str) -> str:
+        """Path of the marker recording that this video's transcript was saved"""
+        return os.path.join(output_dir, ".done", f"{video_id}.done")
+    
+    def _claims(self, output_dir: str) -> dict:
+        """File names taken by done markers, mapped to their video ID (hold _claims_lock)"""
+        claims = self._claims_by_dir.get(output_dir)
+        if claims is None:
+            claims = {}
+            done_dir = os.path.join(output_dir, ".done")
+            try:
+                entries = os.listdir(done_dir)
+            except OSError:
+                entries = []
+            for entry in entries:
+                if not entry.endswith(".done"):
+                    continue
+                try:
+                    with open(os.path.join(done_dir, entry), 'r', encoding='utf-8') as f:
+                        claims[f.read()] = entry[:-len(".done")]
+                except OSError:
+                    pass
+            self._claims_by_dir[output_dir] = claims
+        return claims
+    
+    def _claim_output_name(self, title: str, video_id: str, output_dir: str) -> Tuple[str, bool]:
+        """
+        Pick the file name this video's transcript is saved under
+        
+        Returns the name and True if an unclaimed, non-empty <title>.txt from
+        an earlier run was adopted, in which case nothing needs fetching.
+        """
+        with self._claims_lock:
+            claims = self._claims(output_dir)
+            path = os.path.join(output_dir, f"{title}.txt")
+            owner = claims.get(title)
+            if owner not in (None, video_id) and os.path.exists(path):
+                # Another video owns this title; keep both transcripts
+                name = f"{title} [{video_id}]"
+                claims[name] = video_id
+                return name, False
+            
+            claims[title] = video_id
+            try:
+                open(path, 'xb').close()
+                return title, False
+            except FileExistsError:
+                # Left by an earlier run (before done markers) or by a failed save
+                return title, owner is None and os.path.getsize(path) > 0
+    
+    def _mark_done(self, video_id: str, name: str, output_dir: str) -> None:
+        """Record that this video's transcript is saved as <name>.txt"""
+        marker = self._done_marker(video_id, output_dir)
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, 'w', encoding='utf-8') as f:
+            f.write(name)
+    
+    def find_saved_transcript(self, url: str, output_dir: str = "transcripts") -> Optional[Tuple[str, str]]:
+        """Find the transcript an earlier run saved for this video, without network"""
+        marker = self._done_marker(self._extract_video_id(url), output_dir)
+        try:
+            with open(marker, 'r', encoding='utf-8') as f:
+                name = f.read()
+            path = os.path.join(output_dir, f"{name}.txt")
+            if os.path.getsize(path) > 0:
+                return name, path
+        except OSError:
+            pass
+        return None
+    
     def extract_transcript(self, url: str, output_dir: str = "transcripts") -> Tuple[str, str]:
         """Extract transcript without proxy dependency"""
         try:
@@ -136,6 +364,11 @@ class TranscriptExtractor:
                 return
             logger.info(f"✅ Successfully extracted video ID: {video_id}")
             
+            saved = self.find_saved_transcript(url, output_dir)
+            if saved:
+                logger.info(f"Transcript already saved: {saved[1]}")
+                return saved
+            
             # Pause execution for 5 seconds
             logger.info("⏳ Waiting for 5 seconds before proceeding...")
             time.sleep(5)
@@ -144,54 +377,117 @@ class TranscriptExtractor:
             title = self._fetch_title(url)
             logger.info(f"Video title: {title}")
             
+            os.makedirs(output_dir, exist_ok=True)
+            name, adopted = self._claim_output_name(title, video_id, output_dir)
+            output_path = os.path.join(output_dir, f"{name}.txt")
+            if adopted:
+                self._mark_done(video_id, name, output_dir)
+                logger.info(f"Transcript already saved: {output_path}")
+                return name, output_path
+            
             transcript_data = self._fetch_transcript_direct(video_id)
             
             # Save transcript
-            os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, f"{title}.txt")
+            # One line per caption; collapse line breaks and runs of spaces inside it
+            collapse_ws = _RE_WS.sub
+            payload = "".join(
+                collapse_ws(" ", entry['text']).strip() + "\n" for entry in transcript_data
+            )
+            with open(output_path, 'wb') as f:
+                f.write(payload.encode('utf-8'))
             
-            with open(output_path, 'w', encoding='utf-8') as f:
-                for entry in transcript_data:
-                    f.write(entry['text'] + '\n')
+            self._mark_done(video_id, name, output_dir)
             
             logger.info(f"Transcript saved: {output_path}")
-            return title, output_path
+            return name, output_path
             
         except Exception as e:
             logger.error(f"Failed to extract transcript: {e}")
             raise
 
-def main():
-    extractor = TranscriptExtractor()
+def main(max_workers: int = 8, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+         output_dir: str = "transcripts"):
+    extractor = TranscriptExtractor(cache_dir=cache_dir)
+    os.makedirs(output_dir, exist_ok=True)
     
     # Read URLs
     try:
         with open("urls.txt", "r", encoding="utf-8") as f:
-            urls = [line.strip() for line in f if line.strip()]
+            urls = f.read().split()  # Whitespace-separated; blank lines drop out
     except FileNotFoundError:
         logger.error("urls.txt not found. Create it with one YouTube URL per line.")
         return
     
-    logger.info(f"Processing {len(urls)} URLs...")
     success = fail = 0
     
-    for i, url in enumerate(urls, 1):
-        logger.info(f"[{i}/{len(urls)}] Processing: {url}")
-        time.sleep(10)  # Delay between requests
+    # Drop repeated videos (however their URLs are written), keeping the original order
+    by_video = {}
+    for url in urls:
         try:
-            title, path = extractor.extract_transcript(url)
-            logger.info(f"✓ Success: {title}")
-            # time.sleep(10)  # Delay between requests
-            success += 1
-        except Exception as e:
-            logger.error(f"✗ Failed: {e}")
+            video_id = extractor._extract_video_id(url)
+        except ValueError as e:
+            logger.warning(f"✗ Failed: {e}")
             fail += 1
+            continue
+        by_video.setdefault(video_id, url)
+    urls = list(by_video.values())
+    
+    logger.info(f"Processing {len(urls)} URLs with {max_workers} workers...")
+    
+    def process(i: int, url: str) -> Tuple[str, str]:
+        logger.info(f"[{i}/{len(urls)}] Processing: {url}")
+        if not extractor.find_saved_transcript(url, output_dir):
+            # Delay between requests, jittered so workers don't fire in lockstep
+            extractor._wait()
+        return extractor.extract_transcript(url, output_dir)
+    
+    # Work is network-bound, so threads overlap the waits of several URLs
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(process, i, url) for i, url in enumerate(urls, 1)]
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                title, path = future.result()
+                logger.info(f"[{done}/{len(urls)} done] ✓ Success: {title}")
+                success += 1
+            except Exception as e:
+                logger.warning(f"[{done}/{len(urls)} done] ✗ Failed: {e}")
+                fail += 1
+    except KeyboardInterrupt:
+        # Drop queued URLs instead of waiting for all of them to run
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
     
     logger.info(f"Completed: {success} successful, {fail} failed")
 
+def _positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"must be a whole number, got {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download transcripts for the URLs in urls.txt")
+    parser.add_argument("-j", "--jobs", "--workers", dest="workers", type=_positive_int, default=8, metavar="N",
+                        help="number of URLs processed in parallel (default: 8)")
+    parser.add_argument("-o", "--out", default="transcripts",
+                        help="directory transcripts are saved to (default: transcripts)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always fetch titles and transcripts from YouTube")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_DIR,
+                        help=f"cache directory (default: {DEFAULT_CACHE_DIR})")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        main()
+        main(max_workers=args.workers,
+             cache_dir=None if args.no_cache else args.cache_path,
+             output_dir=args.out)
     except KeyboardInterrupt:
         logger.warning("Interrupted by user")
         sys.exit(1)